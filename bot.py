@@ -14,10 +14,15 @@ Run:
 """
 
 #!/usr/bin/env python3
+import datetime
+import hashlib
+import logging
 import os
+import shutil
 import sys
-import traceback
-from typing import Optional
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
 
 import berserk
 import chess
@@ -25,10 +30,73 @@ import chess.engine
 
 import time
 import requests
+from requests.adapters import HTTPAdapter
 import json
 
+from log_ring import LOG_RING_PATH, LOG_RING_SIZE, RingBufferHandler
+
+# berserk turns wtime/btime/winc/binc into datetimes; _to_ms checks for this exact type
+_DT = datetime.datetime
+
+# Log to stderr (app.log) and, where /dev/shm exists, to the ring the control panel reads
+_log_handlers: List[logging.Handler] = [logging.StreamHandler()]
+if os.path.isdir(os.path.dirname(LOG_RING_PATH)):
+    try:
+        _log_handlers.append(RingBufferHandler(LOG_RING_PATH, LOG_RING_SIZE))
+    except OSError:
+        pass  # the panel falls back to app.log
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+    handlers=_log_handlers,
+)
+logger = logging.getLogger(__name__)
+
 # Path to shared state file for the web panel
 STATE_FILE = os.path.join(os.path.dirname(__file__), "bot_state.json")
+STATE_WRITE_MIN_INTERVAL_SEC = 0.5  # Skip rewriting identical state more often than this
+
+# Path to control file written by the web panel (live skill level changes)
+CONTROL_FILE = os.path.join(os.path.dirname(__file__), "bot_control.json")
+
+# Verified Bot account info, cached per token so bot restarts skip /api/account
+ACCOUNT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "lichess_bot")
+ACCOUNT_CACHE_TTL_SEC = 24 * 3600
+
+
+# CPU topology helpers used to size Stockfish below
+def _usable_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))  # respects taskset/cgroup limits (Linux)
+    except AttributeError:
+        return os.cpu_count() or 4
+
+
+def _parse_cpulist(text: str) -> set:
+    """Parse a sysfs cpulist such as "0-3,8-11" into a set of cpu ids."""
+    cpus = set()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def _node0_cpus() -> Optional[set]:
+    """Usable cpus on NUMA node 0, or None if the topology isn't exposed."""
+    try:
+        with open("/sys/devices/system/node/node0/cpulist", "r", encoding="ascii") as f:
+            cpus = _parse_cpulist(f.read())
+    except (OSError, ValueError):
+        return None
+    try:
+        cpus &= os.sched_getaffinity(0)
+    except AttributeError:
+        pass
+    return cpus or None
+
 
 # ------------ CONFIG ------------
 ACCEPT_RATED = False             # Set True to allow rated games
@@ -39,10 +107,13 @@ MAX_GAME_INCREMENT_SEC = 10      # Accept increment <= 10 seconds
 DEFAULT_THINK_TIME_SEC = 0.2     # Used when no/unknown clock times
 MOVE_OVERHEAD_SEC = 0.05         # Safety buffer
 
-USE_PONDER = False               # Keep it simple for now
+USE_PONDER = True                # Think on the expected reply during the opponent's time
 
 # Stockfish tuning
-STOCKFISH_THREADS = os.cpu_count() or 4
+# Leave one core free for the network/IO threads
+STOCKFISH_THREADS = max(1, _usable_cpus() - 1)
+# Pin Stockfish's threads and memory to one NUMA node when numactl is available
+STOCKFISH_NUMA_PIN = True
 STOCKFISH_HASH_MB = 1024
 
 # Get level from command line if provided, else default 20
@@ -77,31 +148,122 @@ class LichessStockfishBot:
 
         # Lichess API session/client
         session = berserk.TokenSession(token)
+        # Reuse keep-alive connections for the short move/challenge POSTs so they
+        # don't pay a fresh TCP+TLS handshake each time.
+        session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, pool_block=False))
         self.client = berserk.Client(session=session)
 
-        # Ensure we are a Bot.
+        # Background pool for fire-and-forget API calls (moves)
+        self._net_pool = ThreadPoolExecutor(max_workers=2)
+
+        # Last state written to STATE_FILE, used to skip redundant writes
+        self._last_state_json: Optional[str] = None
+        self._last_state_write_ts = 0.0
+
+        # Skill level changes from the panel are picked up from CONTROL_FILE.
+        # Start from its current mtime so a stale file doesn't override argv.
+        self.skill_level = STOCKFISH_SKILL_LEVEL
+        self._control_mtime_ns = self._control_file_mtime_ns()
+
+        # Ensure we are a Bot (cached per token so restarts skip the API call).
+        me = self._load_account(token)
+        self.my_id = me.get("id")
+        self.my_username = me.get("username")
+
+        # Stockfish engine
+        self.engine_path = sf_path
+        self.engine = self._start_engine()
+
+        logger.info(f"Logged in as {self.my_username} ({self.my_id}). Engine at: {self.engine_path}")
+
+    # -------- Account --------
+    def _load_account(self, token: str) -> dict:
+        """Return {"id", "username"} for the token's Bot account, from disk cache if fresh."""
+        token_hash = hashlib.blake2b(token.encode(), digest_size=8).hexdigest()
+        cache_path = os.path.join(ACCOUNT_CACHE_DIR, f"{token_hash}.json")
+
+        try:
+            if time.time() - os.path.getmtime(cache_path) < ACCOUNT_CACHE_TTL_SEC:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except (OSError, ValueError):
+            pass
+
         me = self.client.account.get()
         if not (me.get("bot") or me.get("title") == "BOT"):
             raise RuntimeError(
                 f"Account {me.get('username')} is not a Bot. Upgrade first and use a token with bot:play."
             )
-        self.my_id = me.get("id")
-        self.my_username = me.get("username")
+        account = {"id": me.get("id"), "username": me.get("username")}
 
-        # Stockfish engine
-        self.engine_path = sf_path
-        self.engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
         try:
-            self.engine.configure({
-                "Threads": STOCKFISH_THREADS,
+            os.makedirs(ACCOUNT_CACHE_DIR, exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump(account, f)
+        except OSError:
+            logger.exception("Could not write account cache")
+        return account
+
+    # -------- Engine --------
+    def _start_engine(self) -> chess.engine.SimpleEngine:
+        """Launch Stockfish (NUMA-pinned if possible) and apply our options."""
+        threads = STOCKFISH_THREADS
+        engine = None
+        numactl = shutil.which("numactl") if STOCKFISH_NUMA_PIN else None
+        node_cpus = _node0_cpus() if numactl else None
+        if node_cpus:
+            try:
+                engine = chess.engine.SimpleEngine.popen_uci(
+                    [numactl, "--cpunodebind=0", "--membind=0", self.engine_path]
+                )
+                # Don't run more search threads than node 0 has cpus for us
+                threads = min(threads, len(node_cpus))
+            except Exception as e:
+                logger.warning(f"Could not start Stockfish under numactl ({e}); starting it unpinned")
+
+        if engine is None:
+            engine = chess.engine.SimpleEngine.popen_uci([self.engine_path])
+        try:
+            engine.configure({
+                "Threads": threads,
                 "Hash": STOCKFISH_HASH_MB,
-                "Skill Level": STOCKFISH_SKILL_LEVEL,
+                "Skill Level": self.skill_level,
             })
         except Exception:
             # Some builds use slightly different option names; ignore if not supported.
             pass
+        return engine
 
-        print(f"Logged in as {self.my_username} ({self.my_id}). Engine at: {self.engine_path}")
+    # -------- Control file (from control panel) --------
+    def _control_file_mtime_ns(self) -> int:
+        try:
+            return os.stat(CONTROL_FILE).st_mtime_ns
+        except OSError:
+            return 0
+
+    def _poll_control(self):
+        """Apply a skill level change written by the control panel, without restarting the engine."""
+        mtime_ns = self._control_file_mtime_ns()
+        if mtime_ns == self._control_mtime_ns:
+            return
+        self._control_mtime_ns = mtime_ns
+
+        try:
+            with open(CONTROL_FILE, "r", encoding="utf-8") as f:
+                level = int(json.load(f).get("level"))
+        except Exception:
+            logger.exception("Could not read control file")
+            return
+
+        if not 0 <= level <= 20 or level == self.skill_level:
+            return
+        try:
+            self.engine.configure({"Skill Level": level})
+        except Exception:
+            logger.exception(f"Could not set skill level {level}")
+            return
+        self.skill_level = level
+        logger.info(f"Skill level changed to {level}")
 
     # -------- Challenge handling --------
     def should_accept(self, ch: dict) -> bool:
@@ -125,12 +287,12 @@ class LichessStockfishBot:
 
             return True
         except Exception:
-            traceback.print_exc()
+            logger.exception("Error evaluating challenge")
             return False
 
     def handle_event_stream(self):
         """Main loop reading incoming events from Lichess."""
-        print("Starting event stream...")
+        logger.info("Starting event stream...")
         for event in self.client.bots.stream_incoming_events():
             t = event.get("type")
 
@@ -139,26 +301,24 @@ class LichessStockfishBot:
                 ch_id = ch.get("id")
                 try:
                     if self.should_accept(ch):
-                        print(
+                        logger.info(
                             f"Accepting challenge {ch_id}: "
                             f"{ch.get('challenger', {}).get('name')} / {ch.get('timeControl')}"
                         )
                         self.client.bots.accept_challenge(ch_id)
                     else:
-                        print(f"Declining challenge {ch_id}")
+                        logger.info(f"Declining challenge {ch_id}")
                         self.client.bots.decline_challenge(ch_id)
                 except Exception:
-                    print(f"Error responding to challenge {ch_id}")
-                    traceback.print_exc()
+                    logger.exception(f"Error responding to challenge {ch_id}")
 
             elif t == "gameStart":
                 game_id = event.get("game", {}).get("id")
-                print(f"Game started: {game_id}")
+                logger.info(f"Game started: {game_id}")
                 try:
                     self.play_game(game_id)
                 except Exception:
-                    print(f"Fatal error in game {game_id}")
-                    traceback.print_exc()
+                    logger.exception(f"Fatal error in game {game_id}")
 
             # "gameFinish" events are informational; nothing to do.
 
@@ -171,18 +331,17 @@ class LichessStockfishBot:
                 try:
                     self.handle_event_stream()
                     # If the stream ends cleanly, just reconnect after a short pause
-                    print("Event stream ended, reconnecting in 5 seconds...")
+                    logger.info("Event stream ended, reconnecting in 5 seconds...")
                     time.sleep(5)
                 except (requests.exceptions.ChunkedEncodingError,
                         requests.exceptions.ConnectionError) as e:
-                    print(f"Connection to Lichess lost: {e}. Reconnecting in 5 seconds...")
-                    traceback.print_exc()
+                    logger.exception(f"Connection to Lichess lost: {e}. Reconnecting in 5 seconds...")
                     time.sleep(5)
                 except Exception as e:
-                    print(f"Unexpected error in event loop: {e}. Restarting in 10 seconds...")
-                    traceback.print_exc()
+                    logger.exception(f"Unexpected error in event loop: {e}. Restarting in 10 seconds...")
                     time.sleep(10)
         finally:
+            self._net_pool.shutdown(wait=True)
             try:
                 self.engine.quit()
             except Exception:
@@ -227,11 +386,11 @@ class LichessStockfishBot:
                         or white.get("user", {}).get("username")
                     )
 
-                moves_str = msg.get("state", {}).get("moves", "")
-                self._apply_moves(board, moves_str)
+                toks = msg.get("state", {}).get("moves", "").split()
+                self._sync_board(board, toks)
 
-                last = moves_str.split()[-1] if moves_str else None
-                print(f"[{game_id}] gameFull | last: {last or '(start)'} | turn: {'white' if board.turn else 'black'}")
+                last = toks[-1] if toks else None
+                logger.info(f"[{game_id}] gameFull | last: {last or '(start)'} | turn: {'white' if board.turn else 'black'}")
 
                 # Update shared state
                 color_str = None
@@ -249,17 +408,16 @@ class LichessStockfishBot:
                 )
 
                 # If it's our turn immediately (we are white), move now
-                if my_color is not None and board.turn == my_color:
+                if board.turn is my_color:  # my_color None never matches
                     self._maybe_make_move(game_id, board, msg.get("state", {}), my_color)
 
             elif t == "gameState":
                 # Subsequent updates: new moves & clock times
-                moves_str = msg.get("moves", "")
-                board = chess.Board()  # rebuild from scratch for safety
-                self._apply_moves(board, moves_str)
+                toks = msg.get("moves", "").split()
+                self._sync_board(board, toks)
 
-                last = moves_str.split()[-1] if moves_str else None
-                print(f"[{game_id}] gameState | last: {last or '(start)'} | turn: {'white' if board.turn else 'black'}")
+                last = toks[-1] if toks else None
+                logger.info(f"[{game_id}] gameState | last: {last or '(start)'} | turn: {'white' if board.turn else 'black'}")
 
                 # Update shared state
                 color_str = None
@@ -276,37 +434,71 @@ class LichessStockfishBot:
                     opponent=opponent_name,
                 )
 
-                if my_color is not None and board.turn == my_color:
+                if board.turn is my_color:
                     self._maybe_make_move(game_id, board, msg, my_color)
 
             elif t == "chatLine":
                 # Optional: respond to chat if you like
                 pass
 
-        print(f"Game stream for {game_id} ended.")
+        logger.info(f"Game stream for {game_id} ended.")
+        self._stop_pondering()
         # Mark finished / idle after the game
         self._set_current_game_state(game_id, status="finished")
         # Optionally go fully idle:
         self._clear_state()
 
-    def _apply_moves(self, board: chess.Board, moves_str: str):
-        if not moves_str:
-            return
-        for uci in moves_str.split():
-            try:
-                board.push_uci(uci)
-            except Exception:
-                traceback.print_exc()
+    def _sync_board(self, board: chess.Board, moves: List[str]):
+        """Bring board up to date with the server's move list, pushing only new moves."""
+        applied = len(board.move_stack)
+        if len(moves) < applied or (applied and board.peek().uci() != moves[applied - 1]):
+            # Takeback or diverged history: replay everything from the start position
+            board.reset()
+            applied = 0
+        self._apply_moves(board, moves[applied:])
+
+    def _apply_moves(self, board: chess.Board, moves: List[str]):
+        # Moves come from the Lichess server and are already legal, so skip
+        # push_uci's legality check and push the parsed move directly.
+        # Bind the hot callables once; the loop runs for every move of a gameFull snapshot.
+        push = board.push
+        from_uci = chess.Move.from_uci
+        uci = None
+        try:
+            for uci in moves:
+                push(from_uci(uci))
+        except Exception:
+            # Later moves can't be applied on top of a missing one, so stop here
+            logger.exception(f"Could not apply move {uci}")
 
     # -------- State file helpers (for control panel) --------
     def _write_state(self, data: dict):
-        """Write bot state to JSON file for the control panel."""
+        """Write bot state to JSON file for the control panel.
+
+        Identical state written within STATE_WRITE_MIN_INTERVAL_SEC is skipped.
+        The file is replaced atomically so the panel never reads a partial write.
+        """
         try:
-            data["updated_at"] = time.time()
-            with open(STATE_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f)
+            state_json = json.dumps(data, sort_keys=True)
+            now = time.time()
+            if (state_json == self._last_state_json
+                    and now - self._last_state_write_ts < STATE_WRITE_MIN_INTERVAL_SEC):
+                return
+
+            data["updated_at"] = now
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(STATE_FILE), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, STATE_FILE)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+            self._last_state_json = state_json
+            self._last_state_write_ts = now
         except Exception:
-            traceback.print_exc()
+            logger.exception("Could not write state file")
 
     def _set_current_game_state(self, game_id: Optional[str], status: str,
                                 color: Optional[str] = None,
@@ -328,60 +520,91 @@ class LichessStockfishBot:
     # -------- Time & phase helpers --------
     def _to_ms(self, v) -> int:
         """Best-effort convert Lichess time fields to milliseconds; return 0 if unknown."""
-        try:
-            if v is None:
-                return 0
-            if isinstance(v, (int, float)):
-                return int(v)
-            if isinstance(v, str):
+        t = type(v)
+        if t is int:
+            return v
+        if t is float:
+            return int(v)
+        if t is str:
+            try:
                 return int(float(v))  # handles "12345" and "12345.0"
-            # Some berserk versions may yield datetime objects for timestamps; not usable as remaining time.
-            import datetime
-            if isinstance(v, datetime.datetime):
+            except (ValueError, OverflowError):
                 return 0
-            return 0
-        except Exception:
-            return 0
+        if t is _DT:
+            # berserk decodes the clock millis as an epoch timestamp; undo that
+            return round(v.timestamp() * 1000)
+        # None, or anything else
+        return 0
 
     def _is_endgame(self, board: chess.Board) -> bool:
         """Cheap endgame heuristic: no queens OR few non-pawn pieces remain."""
-        pieces = board.piece_map().values()
-        queens = sum(1 for p in pieces if p.piece_type == chess.QUEEN)
-        non_pawn = sum(1 for p in board.piece_map().values()
-                       if p.piece_type in (chess.ROOK, chess.BISHOP, chess.KNIGHT, chess.QUEEN))
+        queens = chess.popcount(board.queens)
+        non_pawn = chess.popcount(board.queens | board.rooks | board.bishops | board.knights)
         return queens == 0 or non_pawn <= 4
 
     def _maybe_make_move(self, game_id: str, board: chess.Board, state_msg: dict, my_color: bool):
         # Extract remaining times (ms) if present, robust to types
+        # Clocks arrive as berserk datetimes (ints on older versions); _to_ms turns both into ms
         wtime_ms = self._to_ms(state_msg.get("wtime"))
         btime_ms = self._to_ms(state_msg.get("btime"))
 
         my_time_ms = wtime_ms if my_color else btime_ms
-        think = self._choose_think_time(board, my_time_ms)
+        self._poll_control()
+        my_inc_ms = self._to_ms(state_msg.get("winc" if my_color else "binc"))
+        think = self._choose_think_time(board, my_time_ms, my_inc_ms)
 
         try:
             limit = chess.engine.Limit(time=think)
-            result = self.engine.play(board, limit, info=chess.engine.INFO_NONE, ponder=USE_PONDER)
+            # Pin the game token so python-chess only sends ucinewgame when the game
+            # changes, keeping the hash table warm between our moves.
+            result = self.engine.play(
+                board, limit, game=game_id, info=chess.engine.INFO_NONE, ponder=USE_PONDER
+            )
             move = result.move
             if move is None:
-                print(f"[{game_id}] No legal move (game likely over).")
+                logger.warning(f"[{game_id}] No legal move (game likely over).")
                 return
 
-            print(f"[{game_id}] engine move: {move.uci()}  | think={think:.3f}s  | my_time_ms={my_time_ms}")
-            self.client.bots.make_move(game_id, move.uci())
-            # Ponder handling omitted for simplicity
+            logger.info(f"[{game_id}] engine move: {move.uci()}  | think={think:.3f}s  | my_time_ms={my_time_ms}")
+            # Send the move from a worker thread so the game stream isn't blocked on the POST
+            future = self._net_pool.submit(self.client.bots.make_move, game_id, move.uci())
+            future.add_done_callback(lambda f: self._on_move_sent(game_id, f))
+            # With ponder=True the engine keeps searching result.ponder in the background.
+            # The next play() stops it; if the opponent played the predicted move the
+            # hash table is already warm for that line.
         except chess.engine.EngineTerminatedError:
-            print("Engine terminated unexpectedly. Restarting...")
-            self.engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+            logger.error("Engine terminated unexpectedly. Restarting...")
+            self.engine = self._start_engine()
+        except Exception:
+            logger.exception(f"[{game_id}] Error choosing move")
+
+    def _stop_pondering(self):
+        """Stop any background ponder search so the engine idles between games."""
+        if not USE_PONDER:
+            return
+        try:
+            # Any new engine command cancels the running ponder search
+            self.engine.ping()
         except Exception:
-            traceback.print_exc()
+            logger.exception("Could not stop pondering")
 
-    def _choose_think_time(self, board: chess.Board, my_time_ms: int) -> float:
+    def _on_move_sent(self, game_id: str, future: Future):
+        """Report a failed make_move call from the network pool."""
+        exc = future.exception()
+        if exc is not None:
+            logger.error(f"[{game_id}] Error sending move: {exc}", exc_info=exc)
+
+    def _choose_think_time(self, board: chess.Board, my_time_ms: int, my_inc_ms: int = 0) -> float:
         if not my_time_ms or my_time_ms <= 0:
             return DEFAULT_THINK_TIME_SEC
 
         secs = my_time_ms / 1000.0
-        base = max(0.02, min(0.5, secs / 40.0))  # ~2.5% of remaining time, clamped
+        inc = my_inc_ms / 1000.0
+
+        # Expect fewer moves left as the game goes on, but never plan for fewer than 8
+        rem_moves = max(8, 50 - min(40, board.fullmove_number))
+        base = (secs + inc * rem_moves) / rem_moves
+        base = max(0.02, min(secs * 0.1, base))  # never sink more than 10% of the clock
 
         if self._is_endgame(board):
             base *= 0.7
@@ -1,36 +1,251 @@
 #!/usr/bin/env python3
+import fcntl
+import mmap
 import os
+import select
+import signal
 import subprocess
+import sys
 import json
+import tempfile
+import threading
 import time
+from contextlib import contextmanager
+from types import MappingProxyType
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask.json.provider import JSONProvider
 
-app = Flask(__name__)
+from log_ring import LOG_RING_PATH, read_header, read_ring
+
+class ORJSONProvider(JSONProvider):
+    """JSON provider backed by orjson, so jsonify() skips stdlib json and the str→bytes step."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
+
+# The panel lives under /bot/ on the shared domain, so its script does too
+app = Flask(__name__, static_url_path="/bot/static")
+# Also answer /static/..., for a proxy that strips the /bot/ prefix (as the API routes do)
+app.add_url_rule("/static/<path:filename>", endpoint="static")
+app.json = ORJSONProvider(app)
+# Let browsers cache static/control.js instead of re-fetching it on every page load
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 3600
 
 BASE_DIR = os.path.dirname(__file__)
 BOT_SCRIPT = os.path.join(BASE_DIR, "bot.py")
 LOG_FILE = os.path.join(BASE_DIR, "app.log")
 BOT_STATE_FILE = os.path.join(BASE_DIR, "bot_state.json")
-
-# Global state
+BOT_CONTROL_FILE = os.path.join(BASE_DIR, "bot_control.json")
+# Bot pid + level, shared by all gunicorn workers
+BOT_PID_FILE = os.path.join(BASE_DIR, "bot_pid.json")
+# flock'd around every read-modify-write of BOT_PID_FILE
+BOT_LOCK_FILE = os.path.join(BASE_DIR, "bot_pid.lock")
+
+# Environment for the bot process, built once.
+# Override STOCKFISH_PATH here so we IGNORE any bad systemd env.
+BOT_ENV = {**os.environ, "STOCKFISH_PATH": "/usr/games/stockfish"}
+
+# Handle to the bot process this worker spawned (if any).
+# Other workers only know its pid, so BOT_PID_FILE is the source of truth.
 bot_process: Optional[subprocess.Popen] = None
-current_level: int = 20  # default level
+# pidfd for the last pid this worker checked, see _pid_alive()
+_pidfd_cache = {"pid": None, "fd": None}
+_pidfd_lock = threading.Lock()
+# Reentrant in-process half of _bot_record_lock(); the flock fd is held while depth > 0
+_bot_lock = threading.RLock()
+_bot_lock_state = {"fd": None, "depth": 0}
+DEFAULT_LEVEL = 20
+
+# How much of the end of app.log to read for "recent logs", and the last result
+LOG_TAIL_BYTES = 64 * 1024
+_log_tail_cache = {"key": None, "lines": []}
+
+# Shared-memory log ring written by bot.py (see log_ring.py)
+_log_ring = {"mm": None}
+_log_ring_cache = {"key": None, "lines": [], "ring_ns": 0}
+
+# Last parsed bot_state.json, keyed by (mtime_ns, size)
+_bot_state_cache = {"key": None, "val": None}
+
+# Long-poll settings for /state
+STATE_POLL_TIMEOUT_SEC = 25
+STATE_POLL_INTERVAL_SEC = 0.25
+
+# Lichess stats: one background thread (in one worker) refreshes them into
+# STATS_CACHE_FILE; every worker serves them from there.
+STATS_REFRESH_INTERVAL_SEC = 30
+STATS_CACHE_FILE = os.path.join(BASE_DIR, "stats_cache.json")
+STATS_LOCK_FILE = os.path.join(BASE_DIR, "stats_refresher.lock")
+# Touched by workers that want a refresh now; the refresher polls its mtime
+STATS_TRIGGER_FILE = os.path.join(BASE_DIR, "stats_refresh.trigger")
+STATS_TRIGGER_POLL_SEC = 1
+STATS_MIN_REFRESH_SEC = 5  # on-demand refreshes never hit Lichess more often than this
+# Serve nothing rather than numbers this old (the refresher keeps failing)
+STATS_MAX_AGE_SEC = 4 * STATS_REFRESH_INTERVAL_SEC
+_stats_cache = {"key": None, "val": None}
+_refresh_evt = threading.Event()
+_refresher = {"lock_fd": None, "next_try": 0.0}
+_refresher_lock = threading.Lock()
+
+# Keep-alive session for Lichess calls, so stats refreshes reuse TLS connections
+_LICHESS = requests.Session()
+_LICHESS.headers.update({"User-Agent": "stockfish_bot-panel/1"})
+_LICHESS.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4))
 
 # API key for /api/... endpoints
 API_KEY = os.getenv("BOT_PANEL_API_KEY")
 
 
+@contextmanager
+def _bot_record_lock():
+    """
+    Serialize start/stop/level changes across threads and gunicorn workers.
+    Reentrant within a process, so helpers can take it inside a route that already holds it.
+    """
+    with _bot_lock:
+        if _bot_lock_state["depth"] == 0:
+            fd = os.open(BOT_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                raise
+            _bot_lock_state["fd"] = fd
+        _bot_lock_state["depth"] += 1
+        try:
+            yield
+        finally:
+            _bot_lock_state["depth"] -= 1
+            if _bot_lock_state["depth"] == 0:
+                fd = _bot_lock_state["fd"]
+                _bot_lock_state["fd"] = None
+                os.close(fd)  # releases the flock
+
+
+def _read_bot_record() -> dict:
+    """Read the {"pid", "level"} record shared by all panel workers."""
+    try:
+        with open(BOT_PID_FILE, "r", encoding="utf-8") as f:
+            rec = json.load(f)
+    except (OSError, ValueError):
+        rec = {}
+    return {"pid": rec.get("pid"), "level": rec.get("level", DEFAULT_LEVEL)}
+
+
+def _write_bot_record(pid: Optional[int], level: int) -> None:
+    """Atomically replace the shared {"pid", "level"} record."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(BOT_PID_FILE), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"pid": pid, "level": level}, f)
+        os.replace(tmp_path, BOT_PID_FILE)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def get_current_level() -> int:
+    return _read_bot_record()["level"]
+
+
+def set_current_level(level: int) -> None:
+    with _bot_record_lock():
+        rec = _read_bot_record()
+        _write_bot_record(rec["pid"], level)
+
+
+def _close_pidfd() -> None:
+    fd = _pidfd_cache["fd"]
+    _pidfd_cache["pid"] = _pidfd_cache["fd"] = None
+    if fd is not None:
+        os.close(fd)
+
+
+def _is_bot_cmdline(pid: int) -> bool:
+    """
+    True if pid is running BOT_SCRIPT. A stale bot_pid.json can name a pid
+    that has since been reused by an unrelated process.
+    """
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            argv = f.read().split(b"\0")
+    except FileNotFoundError:
+        return False
+    except OSError:
+        return True  # no /proc to ask; trust the record
+    return os.fsencode(BOT_SCRIPT) in argv
+
+
+def _pid_alive(pid: int) -> bool:
+    """
+    Check that the bot pid is alive through a cached pidfd (Linux ≥5.3): it becomes
+    readable once the process exits, and unlike a bare pid it can't be fooled by
+    pid reuse. The cmdline is checked once, when the pidfd is opened.
+    Falls back to os.kill(pid, 0) plus a cmdline check where pidfd_open isn't available.
+    """
+    with _pidfd_lock:
+        if _pidfd_cache["pid"] != pid:
+            _close_pidfd()
+            try:
+                fd = os.pidfd_open(pid)
+            except ProcessLookupError:
+                return False
+            except (AttributeError, OSError):
+                pass  # no pidfd support; use os.kill below
+            else:
+                if not _is_bot_cmdline(pid):
+                    os.close(fd)
+                    return False
+                _pidfd_cache["fd"] = fd
+                _pidfd_cache["pid"] = pid
+
+        fd = _pidfd_cache["fd"]
+        if fd is not None:
+            readable, _, _ = select.select([fd], [], [], 0)
+            return not readable
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by someone else
+    return _is_bot_cmdline(pid)
+
+
+def bot_pid() -> Optional[int]:
+    """Return the pid of the running bot, or None. Works from any worker."""
+    pid = _read_bot_record()["pid"]
+    if pid is None or not _pid_alive(pid):
+        return None
+    return pid
+
+
 def is_bot_running() -> bool:
-    global bot_process
-    return bot_process is not None and bot_process.poll() is None
+    return bot_pid() is not None
 
 
 # ----------------- helpers (shared by HTML + API) ----------------- #
 
+# argv strings for every valid level (0–20), indexed by level
+_LEVEL_ARGS = [str(i) for i in range(21)]
+
+
 def _validate_level(level_value) -> Optional[int]:
     """
     Parse and validate a skill level value. Return int 0–20 or None if invalid.
@@ -47,74 +262,264 @@ def _validate_level(level_value) -> Optional[int]:
 
 def _spawn_bot_process() -> None:
     """
-    Start the bot process using the current_level.
+    Start the bot process using the current level.
     Assumes we already checked that it's not running.
     """
-    global bot_process, current_level
+    global bot_process
 
-    env = os.environ.copy()
-    # Override here so we IGNORE any bad systemd env
-    env["STOCKFISH_PATH"] = "/usr/games/stockfish"
+    with _bot_record_lock():
+        level = get_current_level()
+        # The child gets its own copy of the fd, so close ours right after spawning.
+        # close_fds=False keeps CPython on its posix_spawn fast path instead of fork +
+        # closing every fd up to the ulimit. That's safe because Python creates fds
+        # non-inheritable (PEP 446); only stdout/stderr reach the child.
+        with open(LOG_FILE, "ab") as log:
+            bot_process = subprocess.Popen(
+                ["/home/reza/projects/stockfish_bot/venv/bin/python", BOT_SCRIPT, _LEVEL_ARGS[level]],
+                env=BOT_ENV,
+                stdout=log,
+                stderr=log,
+                close_fds=False,
+            )
+        _write_bot_record(bot_process.pid, level)
 
-    log = open(LOG_FILE, "ab", buffering=0)
-    bot_process = subprocess.Popen(
-        ["/home/reza/projects/stockfish_bot/venv/bin/python", BOT_SCRIPT, str(current_level)],
-        env=env,
-        stdout=log,
-        stderr=log,
-    )
+    # Reap the child as soon as it exits, so os.kill(pid, 0) in every worker sees it gone
+    threading.Thread(target=bot_process.wait, daemon=True).start()
+
+
+def _write_bot_control(level: int) -> None:
+    """
+    Tell the running bot to switch skill level.
+    The bot re-reads bot_control.json before each move, so the engine and its hash survive.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(BOT_CONTROL_FILE), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"level": level}, f)
+        os.replace(tmp_path, BOT_CONTROL_FILE)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 
 def _stop_bot_process() -> bool:
     """
     Stop the bot process if running. Return True if it was running, False otherwise.
+    The bot may have been spawned by another worker, so signal it by pid.
     """
     global bot_process
 
-    if not is_bot_running():
+    with _bot_record_lock():
+        pid = bot_pid()
+        level = get_current_level()
         bot_process = None
-        return False
 
-    bot_process.terminate()
-    try:
-        bot_process.wait(timeout=10)
-    except subprocess.TimeoutExpired:
-        bot_process.kill()
+        if pid is not None:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                pid = None  # already gone, or not ours to stop
+
+        if pid is None:
+            _write_bot_record(None, level)
+            return False
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                break
+            time.sleep(0.1)
+        else:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
 
-    bot_process = None
-    return True
+        _write_bot_record(None, level)
+        with _pidfd_lock:
+            _close_pidfd()
+        return True
+
+
+def _read_log_ring(max_lines: int) -> Optional[tuple]:
+    """
+    Return (last N lines, time of the last write in ns) from bot.py's shared-memory
+    log ring, or None if there is no ring (or it kept changing under us).
+    """
+    mm = _log_ring["mm"]
+    if mm is None:
+        try:
+            fd = os.open(LOG_RING_PATH, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        finally:
+            os.close(fd)
+        _log_ring["mm"] = mm
+
+    seq, _, _ = read_header(mm)
+    key = (seq, max_lines)
+    if _log_ring_cache["key"] == key:
+        return _log_ring_cache["lines"], _log_ring_cache["ring_ns"]
+
+    snap = read_ring(mm)
+    if snap is None:
+        return None
+    seq, written, updated_ns, data = snap
+
+    lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    if written > len(data):
+        lines = lines[1:]  # oldest line was partly overwritten
+    lines = lines[-max_lines:]
+
+    _log_ring_cache["key"] = (seq, max_lines)
+    _log_ring_cache["lines"] = lines
+    _log_ring_cache["ring_ns"] = updated_ns
+    return lines, updated_ns
 
 
 def get_recent_logs(max_lines: int = 200):
-    """Return last N lines from the log file as a list of strings."""
-    if not os.path.exists(LOG_FILE):
+    """
+    Return last N lines from the log ring as a list of strings. Falls back to the
+    tail of app.log when the ring is missing or empty, or when app.log changed after
+    the ring's last write (tracebacks and other output that bypassed logging).
+    """
+    try:
+        st = os.stat(LOG_FILE)
+    except OSError:
+        st = None
+
+    ring = _read_log_ring(max_lines)
+    if ring is not None:
+        lines, ring_ns = ring
+        if lines and (st is None or st.st_mtime_ns <= ring_ns):
+            return lines
+
+    if st is None:
         return []
 
+    key = (st.st_size, st.st_mtime_ns, max_lines)
+    if _log_tail_cache["key"] == key:
+        return _log_tail_cache["lines"]
+
+    # Only read the tail of the file; the log can grow to many MB
+    start = max(0, st.st_size - LOG_TAIL_BYTES)
     try:
-        with open(LOG_FILE, "r", encoding="utf-8", errors="replace") as f:
-            lines = f.readlines()
-        return lines[-max_lines:]
-    except Exception:
+        with open(LOG_FILE, "rb") as f:
+            f.seek(start)
+            tail = f.read()
+    except OSError:
         return []
 
+    lines = tail.decode("utf-8", errors="replace").splitlines(keepends=True)
+    if start > 0:
+        lines = lines[1:]  # first line is probably cut off
+    lines = lines[-max_lines:]
+
+    _log_tail_cache["key"] = key
+    _log_tail_cache["lines"] = lines
+    return lines
+
 
 def read_bot_state():
-    """Read the shared bot_state.json written by bot.py."""
-    if not os.path.exists(BOT_STATE_FILE):
+    """Read the shared bot_state.json written by bot.py (cached until the file changes)."""
+    try:
+        st = os.stat(BOT_STATE_FILE)
+    except OSError:
         return None
+
+    key = (st.st_mtime_ns, st.st_size)
+    if _bot_state_cache["key"] == key:
+        return _bot_state_cache["val"]
+
     try:
-        with open(BOT_STATE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data
-    except Exception:
+        with open(BOT_STATE_FILE, "rb") as f:
+            data = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
         return None
 
+    _bot_state_cache["key"] = key
+    _bot_state_cache["val"] = data
+    return data
+
+
+def _bot_state_mtime_ns() -> int:
+    """Return bot_state.json's mtime in ns, or 0 if it doesn't exist."""
+    try:
+        return os.stat(BOT_STATE_FILE).st_mtime_ns
+    except OSError:
+        return 0
+
+
+# Recent-games endpoint; we only need results, not moves/evals/openings
+_GAMES_URL_TMPL = "https://lichess.org/api/games/user/%s"
+_GAMES_FLAGS = {"moves": "false", "evals": "false", "opening": "false"}
+
+# Read size for the games NDJSON stream (requests defaults to 512 bytes)
+NDJSON_CHUNK_SIZE = 64 * 1024
+
+# Runs the games request alongside the account request (see fetch_bot_stats)
+_STATS_POOL = ThreadPoolExecutor(max_workers=1)
+# Username from the last successful account fetch
+_last_username: Optional[str] = None
+
+# Empty mapping for missing JSON sub-objects (shared, read-only)
+_EMPTY = MappingProxyType({})
+
+# Game statuses that count as a draw when there is no winner
+_DRAW_STATUSES = frozenset({
+    "draw",
+    "stalemate",
+    "timevsinsufficient",
+    "repetition",
+    "agreed",
+    "50move",
+    "insufficient",
+    "threefold",
+})
+
+
+def _fetch_recent_games(username: str, auth_header: dict, max_recent_games: int) -> list:
+    """Fetch the user's last N games (NDJSON) as a list of dicts."""
+    headers = {
+        **auth_header,
+        "Accept": "application/x-ndjson",
+    }
+
+    games_resp = _LICHESS.get(
+        _GAMES_URL_TMPL % username,
+        params={"max": max_recent_games, **_GAMES_FLAGS},
+        headers=headers,
+        timeout=10,
+        stream=True,
+    )
+    games_resp.raise_for_status()
+
+    games = []
+    # Raw bytes straight into orjson (no per-chunk unicode decoding),
+    # read in large chunks to cut the number of socket reads
+    for line in games_resp.iter_lines(chunk_size=NDJSON_CHUNK_SIZE, decode_unicode=False):
+        if not line:
+            continue
+        try:
+            games.append(orjson.loads(line))
+        except Exception:
+            continue
+    return games
+
 
 def fetch_bot_stats(max_recent_games: int = 20):
     """
     Fetch stats from Lichess using the same LICHESS_TOKEN.
     Returns a dict or None on error.
     """
+    global _last_username
+
     token = os.getenv("LICHESS_TOKEN")
     if not token:
         return None
@@ -122,8 +527,15 @@ def fetch_bot_stats(max_recent_games: int = 20):
     try:
         auth_header = {"Authorization": f"Bearer {token}"}
 
+        known_username = _last_username
+        games_future = None
+        if known_username:
+            games_future = _STATS_POOL.submit(
+                _fetch_recent_games, known_username, auth_header, max_recent_games
+            )
+
         # Account info: total games, perfs, username
-        acc_resp = requests.get(
+        acc_resp = _LICHESS.get(
             "https://lichess.org/api/account",
             headers=auth_header,
             timeout=5,
@@ -141,67 +553,45 @@ def fetch_bot_stats(max_recent_games: int = 20):
             "rapid": (perfs.get("rapid") or {}).get("rating"),
         }
 
-        # Last N games as NDJSON
-        games_url = (
-            f"https://lichess.org/api/games/user/{username}"
-            f"?max={max_recent_games}&moves=false&evals=false&opening=false"
-        )
-        headers = {
-            **auth_header,
-            "Accept": "application/x-ndjson",
-        }
-
-        games_resp = requests.get(
-            games_url,
-            headers=headers,
-            timeout=10,
-            stream=True,
-        )
-        games_resp.raise_for_status()
+        # The games request needs the username. When the previous refresh already
+        # told us, it has been running in parallel with the account request.
+        if games_future is not None and username == known_username:
+            games = games_future.result()
+        else:
+            games = _fetch_recent_games(username, auth_header, max_recent_games)
+        _last_username = username
 
         wins = losses = draws = 0
         last_games = []
+        username_lc = username.lower() if username else None
 
-        for line in games_resp.iter_lines(decode_unicode=True):
-            if not line:
-                continue
-            try:
-                g = json.loads(line)
-            except Exception:
-                continue
-
+        for g in games:
             game_id = g.get("id")
             perf = g.get("perf") or g.get("perfType")
-            players = g.get("players", {}) or {}
+            players = g.get("players") or _EMPTY
             winner = g.get("winner")
             status = (g.get("status") or "").lower()
 
             # Find our color and opponent name
+            white = (players.get("white") or _EMPTY).get("user") or _EMPTY
+            black = (players.get("black") or _EMPTY).get("user") or _EMPTY
+            white_name = white.get("name") or white.get("username")
+            black_name = black.get("name") or black.get("username")
+
             color = None
             opponent_name = None
-            for c in ("white", "black"):
-                p = players.get(c, {}) or {}
-                user = p.get("user") or {}
-                name = user.get("name") or user.get("username")
-                if not name:
-                    continue
-                if username and name.lower() == username.lower():
-                    color = c
-                else:
-                    opponent_name = opponent_name or name
+            if white_name and white_name.lower() == username_lc:
+                color = "white"
+            else:
+                opponent_name = white_name
+            if black_name and black_name.lower() == username_lc:
+                color = "black"
+            else:
+                opponent_name = opponent_name or black_name
 
             # Determine result from our point of view
             if winner is None:
-                if status in {
-                    "draw",
-                    "stalemate",
-                    "timevsinsufficient",
-                    "repetition",
-                    "agreed",
-                    "50move",
-                    "insufficient",
-                    "threefold",
-                }:
+                if status in _DRAW_STATUSES:
                     result = "draw"
                     draws += 1
                 else:
@@ -244,6 +634,129 @@ def fetch_bot_stats(max_recent_games: int = 20):
         return None
 
 
+def _refresh_stats() -> None:
+    """Fetch stats and publish them to STATS_CACHE_FILE (keeps the old data on failure)."""
+    data = fetch_bot_stats()
+    if data is None:
+        return
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(STATS_CACHE_FILE), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(orjson.dumps({"fetched_at": time.time(), "stats": data}))
+            os.replace(tmp_path, STATS_CACHE_FILE)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        print("Error saving bot stats:", e)
+
+
+def _stats_trigger_mtime_ns() -> int:
+    try:
+        return os.stat(STATS_TRIGGER_FILE).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _request_stats_refresh() -> None:
+    """Ask the refresher (possibly in another worker) for a refresh now."""
+    if _ensure_stats_refresher():
+        _refresh_evt.set()
+        return
+    try:
+        with open(STATS_TRIGGER_FILE, "a"):
+            pass
+        os.utime(STATS_TRIGGER_FILE)
+    except OSError as e:
+        print("Error requesting stats refresh:", e)
+
+
+def _stats_refresher() -> None:
+    """
+    Refresh stats every STATS_REFRESH_INTERVAL_SEC, or sooner when _refresh_evt is set
+    or STATS_TRIGGER_FILE is touched, but at most once per STATS_MIN_REFRESH_SEC.
+    """
+    while True:
+        trigger = _stats_trigger_mtime_ns()
+        _refresh_evt.clear()
+        _refresh_stats()
+
+        started = time.monotonic()
+        while True:
+            elapsed = time.monotonic() - started
+            if elapsed >= STATS_REFRESH_INTERVAL_SEC:
+                break
+            requested = _refresh_evt.is_set() or _stats_trigger_mtime_ns() != trigger
+            if requested and elapsed >= STATS_MIN_REFRESH_SEC:
+                break
+            timeout = min(STATS_TRIGGER_POLL_SEC, STATS_REFRESH_INTERVAL_SEC - elapsed)
+            if requested:
+                time.sleep(min(timeout, STATS_MIN_REFRESH_SEC - elapsed))
+            else:
+                _refresh_evt.wait(timeout)
+
+
+def _ensure_stats_refresher() -> bool:
+    """
+    Run the refresher thread in exactly one process: whoever holds a flock on
+    STATS_LOCK_FILE. Other workers retry now and then, in case the holder exits.
+    Called lazily from requests, so it runs in the worker after gunicorn forks.
+    Return True if this process runs the refresher.
+    """
+    with _refresher_lock:
+        if _refresher["lock_fd"] is not None:
+            return True
+        now = time.monotonic()
+        if now < _refresher["next_try"]:
+            return False
+        _refresher["next_try"] = now + STATS_REFRESH_INTERVAL_SEC
+
+        fd = os.open(STATS_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        _refresher["lock_fd"] = fd  # held for the life of the process
+        threading.Thread(target=_stats_refresher, daemon=True).start()
+        return True
+
+
+def get_cached_stats(block_if_empty: bool = False) -> Optional[dict]:
+    """
+    Return the last published {"fetched_at", "stats"} record, or None until the first
+    refresh lands or once it is older than STATS_MAX_AGE_SEC.
+    With block_if_empty, fetch inline when nothing has been published yet.
+    """
+    _ensure_stats_refresher()
+
+    try:
+        st = os.stat(STATS_CACHE_FILE)
+    except OSError:
+        if not block_if_empty:
+            return None
+        data = fetch_bot_stats()
+        return None if data is None else {"fetched_at": time.time(), "stats": data}
+
+    key = (st.st_mtime_ns, st.st_size)
+    if _stats_cache["key"] != key:
+        try:
+            with open(STATS_CACHE_FILE, "rb") as f:
+                val = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            val = _stats_cache["val"]
+        else:
+            _stats_cache["key"] = key
+            _stats_cache["val"] = val
+
+    rec = _stats_cache["val"]
+    if not rec or time.time() - rec.get("fetched_at", 0) > STATS_MAX_AGE_SEC:
+        return None
+    return rec
+
+
 def require_api_key(f):
     """
     Decorator to protect API endpoints with X-API-Key.
@@ -264,31 +777,83 @@ def require_api_key(f):
 
 @app.route("/bot/", methods=["GET"])
 def index():
-    logs = get_recent_logs(200)
-    game_state = read_bot_state()
-    stats = fetch_bot_stats()
-
+    # Game, stats and logs are fetched by static/control.js after the page loads
     return render_template(
         "control.html",
         running=is_bot_running(),
-        current_level=current_level,
-        logs=logs,
-        game=game_state,
-        stats=stats,
+        current_level=get_current_level(),
     )
 
 
+@app.route("/status", methods=["GET"])
+@app.route("/bot/status", methods=["GET"])
+def panel_status():
+    """Bot status for the HTML panel (polled every second)."""
+    pid = bot_pid()
+    return jsonify({
+        "ok": True,
+        "running": pid is not None,
+        "level": get_current_level(),
+        "pid": pid,
+    }), 200
+
+
+@app.route("/logs", methods=["GET"])
+@app.route("/bot/logs", methods=["GET"])
+def panel_logs():
+    """Recent log lines for the HTML panel (polled every 5 s)."""
+    return jsonify({
+        "ok": True,
+        "lines": get_recent_logs(200),
+    }), 200
+
+
+@app.route("/stats", methods=["GET"])
+@app.route("/bot/stats", methods=["GET"])
+def panel_stats():
+    """Cached Lichess stats for the HTML panel (polled every minute)."""
+    rec = get_cached_stats()
+    return jsonify({
+        "ok": True,
+        "stats": rec and rec["stats"],
+        "fetched_at": rec and rec["fetched_at"],
+    }), 200
+
+
+@app.route("/state", methods=["GET"])
+@app.route("/bot/state", methods=["GET"])
+def state():
+    """
+    Long-poll the shared bot state.
+    With ?since=<mtime>, block until bot_state.json changes or the timeout expires.
+    The token is an opaque string: a nanosecond mtime does not survive a JS number.
+    """
+    since = request.args.get("since")
+    mtime = str(_bot_state_mtime_ns())
+
+    if since is not None:
+        deadline = time.monotonic() + STATE_POLL_TIMEOUT_SEC
+        while mtime == since and time.monotonic() < deadline:
+            time.sleep(STATE_POLL_INTERVAL_SEC)
+            mtime = str(_bot_state_mtime_ns())
+
+    return jsonify({
+        "ok": True,
+        "mtime": mtime,
+        "state": read_bot_state(),
+    }), 200
+
+
 @app.route("/start", methods=["POST"])
 def start_bot():
-    global current_level
-
     level_str = request.form.get("level")
     lvl = _validate_level(level_str)
     if lvl is not None:
-        current_level = lvl
+        set_current_level(lvl)
 
-    if not is_bot_running():
-        _spawn_bot_process()
+    with _bot_record_lock():
+        if not is_bot_running():
+            _spawn_bot_process()
 
     return redirect(url_for("index"))
 
@@ -302,18 +867,16 @@ def stop_bot():
 @app.route("/set_level", methods=["POST"])
 def set_level():
     """
-    Change level; if bot is running, restart it with the new level.
+    Change level; if bot is running, it picks up the new level live.
     """
-    global current_level
-
     level_str = request.form.get("level")
     lvl = _validate_level(level_str)
     if lvl is not None:
-        current_level = lvl
+        set_current_level(lvl)
 
-    if is_bot_running():
-        _stop_bot_process()
-        _spawn_bot_process()
+    with _bot_record_lock():
+        if is_bot_running():
+            _write_bot_control(get_current_level())
 
     return redirect(url_for("index"))
 
@@ -323,9 +886,10 @@ def restart_bot():
     """
     Restart the bot from the web page.
     """
-    if is_bot_running():
-        _stop_bot_process()
-    _spawn_bot_process()
+    with _bot_record_lock():
+        if is_bot_running():
+            _stop_bot_process()
+        _spawn_bot_process()
     return redirect(url_for("index"))
 
 
@@ -335,11 +899,11 @@ def restart_bot():
 @app.route("/bot/api/bot/status", methods=["GET"])
 @require_api_key
 def api_bot_status():
-    pid = bot_process.pid if is_bot_running() else None
+    pid = bot_pid()
     return jsonify({
         "ok": True,
-        "running": is_bot_running(),
-        "level": current_level,
+        "running": pid is not None,
+        "level": get_current_level(),
         "pid": pid,
     }), 200
 
@@ -348,8 +912,6 @@ def api_bot_status():
 @app.route("/bot/api/bot/start", methods=["POST"])
 @require_api_key
 def api_bot_start():
-    global current_level
-
     data = request.get_json(silent=True) or {}
     if "level" in data:
         lvl = _validate_level(data["level"])
@@ -358,21 +920,22 @@ def api_bot_start():
                 "ok": False,
                 "error": "Invalid 'level'. Must be integer 0–20."
             }), 400
-        current_level = lvl
+        set_current_level(lvl)
 
-    if is_bot_running():
-        started = False
-    else:
-        _spawn_bot_process()
-        started = True
+    with _bot_record_lock():
+        if is_bot_running():
+            started = False
+        else:
+            _spawn_bot_process()
+            started = True
 
-    pid = bot_process.pid if is_bot_running() else None
+    pid = bot_pid()
 
     return jsonify({
         "ok": True,
         "started": started,
-        "running": is_bot_running(),
-        "level": current_level,
+        "running": pid is not None,
+        "level": get_current_level(),
         "pid": pid,
     }), 200
 
@@ -381,14 +944,13 @@ def api_bot_start():
 @app.route("/bot/api/bot/stop", methods=["POST"])
 @require_api_key
 def api_bot_stop():
-    was_running = is_bot_running()
-    _stop_bot_process()
+    was_running = _stop_bot_process()
 
     return jsonify({
         "ok": True,
         "stopped": was_running,
-        "running": is_bot_running(),
-        "level": current_level,
+        "running": False,
+        "level": get_current_level(),
         "pid": None,
     }), 200
 
@@ -397,12 +959,10 @@ def api_bot_stop():
 @app.route("/bot/api/bot/level", methods=["GET", "POST"])
 @require_api_key
 def api_bot_level():
-    global current_level
-
     if request.method == "GET":
         return jsonify({
             "ok": True,
-            "level": current_level,
+            "level": get_current_level(),
         }), 200
 
     data = request.get_json(silent=True) or {}
@@ -419,11 +979,11 @@ def api_bot_level():
             "error": "Invalid 'level'. Must be integer 0–20."
         }), 400
 
-    current_level = lvl
+    set_current_level(lvl)
 
     return jsonify({
         "ok": True,
-        "level": current_level,
+        "level": lvl,
         "running": is_bot_running(),
     }), 200
 
@@ -432,18 +992,19 @@ def api_bot_level():
 @app.route("/bot/api/bot/restart", methods=["POST"])
 @require_api_key
 def api_bot_restart():
-    was_running = is_bot_running()
-    if was_running:
-        _stop_bot_process()
-    _spawn_bot_process()
-    pid = bot_process.pid if is_bot_running() else None
+    with _bot_record_lock():
+        was_running = is_bot_running()
+        if was_running:
+            _stop_bot_process()
+        _spawn_bot_process()
+    pid = bot_pid()
 
     return jsonify({
         "ok": True,
         "restarted": True,
         "was_running": was_running,
-        "running": is_bot_running(),
-        "level": current_level,
+        "running": pid is not None,
+        "level": get_current_level(),
         "pid": pid,
     }), 200
 
@@ -479,8 +1040,8 @@ def api_bot_current_game():
 @app.route("/bot/api/bot/stats", methods=["GET"])
 @require_api_key
 def api_bot_stats():
-    stats = fetch_bot_stats()
-    if stats is None:
+    rec = get_cached_stats(block_if_empty=True)
+    if rec is None:
         return jsonify({
             "ok": False,
             "error": "Unable to fetch stats (check LICHESS_TOKEN).",
@@ -488,9 +1049,31 @@ def api_bot_stats():
 
     return jsonify({
         "ok": True,
-        "stats": stats,
+        "stats": rec["stats"],
+        "fetched_at": rec["fetched_at"],
     }), 200
 
 
+@app.route("/api/bot/stats/refresh", methods=["POST"])
+@app.route("/bot/api/bot/stats/refresh", methods=["POST"])
+@require_api_key
+def api_bot_stats_refresh():
+    """Ask for fresh Lichess stats now instead of at the next scheduled refresh."""
+    _request_stats_refresh()
+
+    return jsonify({
+        "ok": True,
+        "refreshing": True,
+    }), 202
+
+
 if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=8000)
+    # Serve through gunicorn (settings in gunicorn.conf.py); Flask's dev server is single-process.
+    # Run it from this interpreter, so it works from an unactivated venv too.
+    base_dir = os.path.abspath(BASE_DIR)
+    os.execv(sys.executable, [
+        sys.executable, "-m", "gunicorn",
+        "--chdir", base_dir,
+        "-c", os.path.join(base_dir, "gunicorn.conf.py"),
+        "control_panel:app",
+    ])
@@ -0,0 +1,12 @@
+# Gunicorn settings for the control panel:
+#   gunicorn -c gunicorn.conf.py control_panel:app
+#
+# Several workers so a slow Lichess stats fetch or a /state long-poll doesn't
+# block status/level calls. Bot pid + level live in bot_pid.json, so every
+# worker sees the same bot.
+
+bind = "127.0.0.1:8000"
+workers = 4
+worker_class = "gthread"
+threads = 8
+preload_app = True
@@ -0,0 +1,94 @@
+"""
+Shared-memory log ring: bot.py writes its log output here, control_panel.py reads it.
+
+Layout: a header of three little-endian u64s (sequence, count of bytes ever written,
+wall-clock time of the last write in ns), then `size` bytes of data written circularly.
+The header is a seqlock: the writer makes the sequence odd before touching the data
+and even again afterwards, so a reader that sees the same even sequence before and
+after copying got a clean snapshot.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Optional, Tuple
+
+LOG_RING_PATH = "/dev/shm/stockfish_bot.ring"
+LOG_RING_SIZE = 256 * 1024
+
+HEADER = struct.Struct("<QQQ")
+_SEQ = struct.Struct("<Q")       # header[0]
+_COUNTS = struct.Struct("<QQ")   # header[1:], written before the closing sequence bump
+
+
+class RingBufferHandler(logging.Handler):
+    """Logging handler that keeps the latest log output in the ring (single writer)."""
+
+    def __init__(self, path: str, size: int):
+        super().__init__()
+        total = HEADER.size + size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != total:
+                os.ftruncate(fd, 0)  # drop contents laid out for another size
+                os.ftruncate(fd, total)
+            self._buf = mmap.mmap(fd, total)
+        finally:
+            os.close(fd)
+        self._size = size
+        # Continue after the previous run's output
+        seq, self._written, _ = HEADER.unpack_from(self._buf, 0)
+        self._seq = seq + (seq & 1)  # a crash mid-write leaves it odd
+        _SEQ.pack_into(self._buf, 0, self._seq)
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            data = (self.format(record) + "\n").encode("utf-8", errors="replace")
+        except Exception:
+            self.handleError(record)
+            return
+
+        data = data[-self._size:]
+        hdr = HEADER.size
+        pos = self._written % self._size
+        first = min(len(data), self._size - pos)
+
+        self._seq += 1
+        _SEQ.pack_into(self._buf, 0, self._seq)
+        self._buf[hdr + pos:hdr + pos + first] = data[:first]
+        if first < len(data):
+            self._buf[hdr:hdr + len(data) - first] = data[first:]
+        self._written += len(data)
+        _COUNTS.pack_into(self._buf, _SEQ.size, self._written, time.time_ns())
+        self._seq += 1
+        _SEQ.pack_into(self._buf, 0, self._seq)
+
+
+def read_header(mm) -> Tuple[int, int, int]:
+    """Return (sequence, written, updated_ns) without checking for a concurrent write."""
+    return HEADER.unpack_from(mm, 0)
+
+
+def read_ring(mm, retries: int = 3) -> Optional[Tuple[int, int, int, bytes]]:
+    """
+    Return (sequence, written, updated_ns, data) from a consistent snapshot, oldest
+    byte first, or None if the writer kept getting in the way.
+    """
+    hdr = HEADER.size
+    size = len(mm) - hdr
+    for _ in range(retries):
+        seq, written, updated_ns = HEADER.unpack_from(mm, 0)
+        if seq & 1:
+            time.sleep(0)  # writer is mid-update; let it finish
+            continue
+
+        if written <= size:
+            data = mm[hdr:hdr + written]
+        else:
+            pos = written % size
+            data = mm[hdr + pos:] + mm[hdr:hdr + pos]
+        if _SEQ.unpack_from(mm, 0)[0] == seq:
+            return seq, written, updated_ns, data
+    return None
@@ -0,0 +1,148 @@
+// Control panel updates. The page itself is rendered nearly empty; everything
+// below is fetched as JSON on its own schedule.
+(function () {
+    var urls = document.body.dataset;
+
+    var STATUS_INTERVAL_MS = 1000;
+    var LOGS_INTERVAL_MS = 5000;
+    var STATS_INTERVAL_MS = 60000;
+    var RETRY_MS = 5000;
+
+    function esc(v) {
+        var d = document.createElement("div");
+        d.textContent = v;
+        return d.innerHTML;
+    }
+
+    function getJSON(url) {
+        return fetch(url).then(function (r) { return r.json(); });
+    }
+
+    // render may return a delay to use instead of ms for the next poll
+    function every(ms, url, render) {
+        function tick() {
+            getJSON(url)
+                .then(render)
+                .catch(function () {})
+                .then(function (next) { setTimeout(tick, next || ms); });
+        }
+        tick();
+    }
+
+    // ---- Status ----
+    var statusBox = document.getElementById("status");
+    var statusText = document.getElementById("status-text");
+    var levelText = document.getElementById("status-level");
+
+    function renderStatus(data) {
+        statusBox.className = "status " + (data.running ? "running" : "stopped");
+        statusText.textContent = data.running ? "Bot is RUNNING" : "Bot is STOPPED";
+        levelText.textContent = data.level;
+    }
+
+    // ---- Current game (long-poll /state) ----
+    // The server answers as soon as bot_state.json changes (or after a
+    // timeout), and we immediately ask again.
+    var gameBox = document.getElementById("current-game");
+
+    function renderGame(game) {
+        if (!game || game.status !== "playing") {
+            gameBox.innerHTML = "<p>No active game detected.</p>";
+            return;
+        }
+        var color = game.color
+            ? game.color.charAt(0).toUpperCase() + game.color.slice(1)
+            : "Unknown";
+        gameBox.innerHTML =
+            "<p>" +
+            "<strong>In game:</strong> Yes<br>" +
+            "<strong>Game ID:</strong> " + esc(game.game_id) + "<br>" +
+            "<strong>Color:</strong> " + esc(color) + "<br>" +
+            "<strong>Opponent:</strong> " + esc(game.opponent || "Unknown") + "<br>" +
+            "<strong>Last move:</strong> " + esc(game.last_move || "N/A") +
+            "</p>";
+    }
+
+    function pollState(since) {
+        var url = since === null ? urls.stateUrl : urls.stateUrl + "?since=" + encodeURIComponent(since);
+        getJSON(url)
+            .then(function (data) {
+                renderGame(data.state);
+                pollState(data.mtime);
+            })
+            .catch(function () {
+                setTimeout(function () { pollState(since); }, RETRY_MS);
+            });
+    }
+
+    // ---- Stats ----
+    var statsBox = document.getElementById("stats");
+
+    function renderStats(data) {
+        var s = data.stats;
+        if (!s) {
+            statsBox.innerHTML =
+                "<p>Statistics not available yet (refresh in a moment, or check LICHESS_TOKEN).</p>";
+            return RETRY_MS;  // the first refresh is usually seconds away
+        }
+        var html =
+            "<p>" +
+            "<strong>Account:</strong> " + esc(s.username) + "<br>" +
+            "<strong>Total games:</strong> " + esc(s.total_games) + "<br>" +
+            "<strong>Updated:</strong> " + esc(new Date(data.fetched_at * 1000).toLocaleTimeString()) +
+            "</p>" +
+            "<h3>Ratings</h3>" +
+            "<ul>" +
+            "<li>Bullet: " + esc(s.ratings.bullet || "N/A") + "</li>" +
+            "<li>Blitz: " + esc(s.ratings.blitz || "N/A") + "</li>" +
+            "<li>Rapid: " + esc(s.ratings.rapid || "N/A") + "</li>" +
+            "</ul>" +
+            "<h3>Recent Performance (last " + esc(s.recent.games_analyzed) + " games)</h3>" +
+            "<ul>" +
+            "<li>Wins: " + esc(s.recent.wins) + "</li>" +
+            "<li>Losses: " + esc(s.recent.losses) + "</li>" +
+            "<li>Draws: " + esc(s.recent.draws) + "</li>" +
+            "</ul>";
+
+        var games = s.recent.last_games || [];
+        if (games.length) {
+            html +=
+                "<h3>Last Games</h3>" +
+                "<table><thead><tr>" +
+                "<th>#</th><th>Game ID</th><th>Perf</th><th>Result</th><th>Opponent</th>" +
+                "</tr></thead><tbody>";
+            games.forEach(function (g, i) {
+                html +=
+                    "<tr>" +
+                    "<td>" + (i + 1) + "</td>" +
+                    "<td>" + esc(g.id) + "</td>" +
+                    "<td>" + esc(g.perf || "N/A") + "</td>" +
+                    "<td>" + esc(g.result) + "</td>" +
+                    "<td>" + esc(g.opponent || "Unknown") + "</td>" +
+                    "</tr>";
+            });
+            html += "</tbody></table>";
+        }
+        statsBox.innerHTML = html;
+    }
+
+    // ---- Logs ----
+    var logsBox = document.getElementById("logs");
+
+    function renderLogs(data) {
+        if (!data.lines || !data.lines.length) {
+            logsBox.innerHTML = "<p>No logs available.</p>";
+            return;
+        }
+        var pre = document.createElement("pre");
+        pre.className = "logs";
+        pre.textContent = data.lines.join("");
+        logsBox.replaceChildren(pre);
+        pre.scrollTop = pre.scrollHeight;
+    }
+
+    every(STATUS_INTERVAL_MS, urls.statusUrl, renderStatus);
+    every(LOGS_INTERVAL_MS, urls.logsUrl, renderLogs);
+    every(STATS_INTERVAL_MS, urls.statsUrl, renderStats);
+    pollState(null);
+})();